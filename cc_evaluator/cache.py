@@ -0,0 +1,68 @@
+"""
+磁盘缓存读写工具
+"""
+import json
+import os
+import pickle
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+def load_json_cache(path: Path) -> Dict[str, Any]:
+    """读取JSON缓存文件，不存在或已损坏时返回空字典"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def save_json_cache(path: Path, data: Dict[str, Any]):
+    """原子写入JSON缓存文件（先写临时文件再替换），写入失败时静默忽略"""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+    except OSError:
+        pass
+
+
+def load_pickle_cache(path: Path, key: Any) -> Optional[Any]:
+    """读取pickle缓存，缓存不存在、已损坏或键不匹配时返回None"""
+    try:
+        with open(path, 'rb') as f:
+            cached_key, value = pickle.load(f)
+    except Exception:  # 文件缺失/损坏或模型结构变化导致的各类反序列化错误
+        return None
+    return value if cached_key == key else None
+
+
+def save_pickle_cache(path: Path, key: Any, value: Any):
+    """原子写入pickle缓存（连同缓存键一起保存），写入失败时静默忽略"""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(temp_path, 'wb') as f:
+            pickle.dump((key, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    except OSError:
+        pass
+
+
+def prune_cache_dir(directory: Path, pattern: str, max_files: int):
+    """目录中匹配的缓存文件超过 max_files 个时，按修改时间删除最旧的文件，失败时静默忽略"""
+    try:
+        files = [(f.stat().st_mtime_ns, f) for f in directory.glob(pattern)]
+    except OSError:
+        return
+    if len(files) <= max_files:
+        return
+    files.sort(key=lambda item: item[0])
+    for _, f in files[:len(files) - max_files]:
+        try:
+            f.unlink()
+        except OSError:
+            pass
@@ -7,6 +7,9 @@ from pathlib import Path
 # Claude Code 日志目录
 CLAUDE_PROJECTS_DIR = Path(os.path.expanduser("~/.claude/projects"))
 
+# 本工具的缓存目录
+CACHE_DIR = Path(os.path.expanduser("~/.cache/cc_evaluator"))
+
 # 评分时要过滤的提示词关键词（不计入统计）
 FILTER_KEYWORDS = ['评分', '评估', '打分', 'score', 'evaluate', 'eval', 'cc-eval', '打个分']
 
@@ -32,6 +32,11 @@ class BaseEvaluator(ABC):
         """权重，默认为1.0"""
         return self.config.get('weight', 1.0)
     
+    @property
+    def enabled(self) -> bool:
+        """是否启用（权重为0的维度视为禁用，不参与评分和总分）"""
+        return self.weight != 0
+    
     @abstractmethod
     def evaluate(self, session: SessionData) -> float:
         """
@@ -1,16 +1,71 @@
 """
 维度6: 代码质量评分器
 """
+import ast
+import hashlib
+import json
+import re
 import subprocess
 import tempfile
+import tokenize
 import os
-from pathlib import Path
-from typing import Tuple, Optional
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from statistics import fmean
+from typing import Dict, List, Optional, Tuple
 
+from ..cache import load_json_cache, save_json_cache
 from ..models import SessionData
-from ..config import LANGUAGE_CONFIG
+from ..config import LANGUAGE_CONFIG, CACHE_DIR
 from .base import BaseEvaluator
 
+# 优先在进程内调用 radon / pyflakes / pycodestyle，避免每次分析都启动子进程
+# （noqa 注释的匹配规则和 pyflakes 错误编号直接取自 flake8，与命令行结果保持一致）
+try:
+    import pycodestyle
+    from flake8.defaults import NOQA_INLINE_REGEXP
+    from flake8.plugins.pyflakes import FLAKE8_PYFLAKES_CODES
+    from flake8.utils import parse_comma_separated_list
+    from pyflakes.checker import Checker as PyflakesChecker
+    from radon.complexity import cc_visit_ast
+    from radon.metrics import mi_visit
+    HAS_ANALYZER_LIBS = True
+    
+    # pycodestyle 的选项解析只需做一次，所有代码共用
+    _STYLE_GUIDE = pycodestyle.StyleGuide(quiet=True, select=['E', 'W'])
+    
+    class _ViolationReport(pycodestyle.BaseReport):
+        """记录每条计入的错误 (行号, 错误编号)，供 noqa 过滤"""
+        
+        def __init__(self, options):
+            super().__init__(options)
+            self.violations = []
+        
+        def error(self, line_number, offset, text, check):
+            code = super().error(line_number, offset, text, check)
+            if code:
+                self.violations.append((line_number, code))
+            return code
+except ImportError:
+    HAS_ANALYZER_LIBS = False
+
+# radon 统计复杂度的代码块类型
+_BLOCK_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+# 命令行工具从stdin读取代码时使用的文件名
+STDIN_PATH = '-'
+
+# pycodestyle 自行识别的 noqa/nopep8 注释（其中 o 替换为 _ 后不再被识别，且不改变行宽）
+_PYCODESTYLE_NOQA_RE = re.compile(r'(# n)o(?=(?:qa|pep8)\b)', re.I)
+
+# 代码质量分析结果缓存: {内容哈希: [圈复杂度, 可维护性, Lint错误数]}，按最近使用顺序排列
+QUALITY_CACHE_FILE = CACHE_DIR / "code_quality.json"
+# 分析规则变化（如开始遵循 noqa 注释）时递增，使旧的缓存结果失效
+QUALITY_CACHE_VERSION = 2
+# 缓存最多保留的条目数，超出时淘汰最久未使用的
+QUALITY_CACHE_MAX_ENTRIES = 5000
+_quality_cache: Optional['OrderedDict[str, list]'] = None
+
 
 class CodeQualityEvaluator(BaseEvaluator):
     """
@@ -19,7 +74,8 @@ class CodeQualityEvaluator(BaseEvaluator):
     逻辑：
     - 分析生成代码的圈复杂度（使用radon）
     - 分析可维护性指数（使用radon mi）
-    - 检查Lint错误（使用flake8）
+    - 检查Lint错误（使用pyflakes + pycodestyle，与flake8一致）
+    - 未安装上述库时回退到调用 radon / flake8 命令行
     - 综合三项指标加权计算最终分数
     
     公式：
@@ -39,19 +95,8 @@ class CodeQualityEvaluator(BaseEvaluator):
             self._detail = "无代码生成"
             return 1.0
         
-        # 配置参数
-        complexity_weight = self.config.get('complexity_weight', 0.4)
-        maintainability_weight = self.config.get('maintainability_weight', 0.4)
-        lint_weight = self.config.get('lint_weight', 0.2)
-        max_complexity = self.config.get('max_complexity', 20)
-        max_lint_errors = self.config.get('max_lint_errors', 10)
-        
-        # 收集所有Python代码
-        python_codes = []
-        for op in session.code_operations:
-            ext = Path(op.file_path).suffix.lower()
-            if ext == '.py' and op.content:
-                python_codes.append((op.file_path, op.content))
+        # 解析时已筛选出的Python代码操作
+        python_codes = [(op.file_path, op.content) for op in session.python_operations]
         
         if not python_codes:
             # 非Python代码，使用简化评估
@@ -59,6 +104,13 @@ class CodeQualityEvaluator(BaseEvaluator):
             self._detail = "非Python代码（简化评估）"
             return 0.85
         
+        # 配置参数
+        complexity_weight = self.config.get('complexity_weight', 0.4)
+        maintainability_weight = self.config.get('maintainability_weight', 0.4)
+        lint_weight = self.config.get('lint_weight', 0.2)
+        max_complexity = self.config.get('max_complexity', 20)
+        max_lint_errors = self.config.get('max_lint_errors', 10)
+        
         # 分析代码质量
         avg_complexity, avg_mi, total_lint = self._analyze_python_codes(python_codes)
         
@@ -103,109 +155,279 @@ class CodeQualityEvaluator(BaseEvaluator):
         """
         分析Python代码质量
         
+        以代码内容的哈希为键缓存每段代码的分析结果，重复出现的代码不再重新分析；
+        有新结果时每次评估只写回一次磁盘
+        
         Args:
             codes: [(file_path, content), ...]
         
         Returns:
             (avg_complexity, avg_maintainability, total_lint_errors)
         """
-        complexities = []
-        maintainabilities = []
-        lint_errors = 0
+        cache = _load_quality_cache()
+        keys = [_content_key(content) for _, content in codes]
         
-        for file_path, content in codes:
-            # 创建临时文件
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-                f.write(content)
-                temp_path = f.name
+        # 只分析缓存未命中的代码；命中的结果先取出，之后的淘汰不会影响本次评估
+        results = {}
+        misses = {}
+        for key, (_, content) in zip(keys, codes):
+            if key in cache:
+                cache.move_to_end(key)  # 标记为最近使用
+                results[key] = cache[key]
+            elif key not in misses:
+                misses[key] = content
+        
+        if misses:
+            contents = list(misses.values())
+            if HAS_ANALYZER_LIBS:
+                analyzed = [self._analyze_source(content) for content in contents]
+            else:
+                analyzed = self._analyze_with_cli(contents)
             
-            try:
-                # 分析圈复杂度
-                cc = self._get_cyclomatic_complexity(temp_path)
-                if cc is not None:
-                    complexities.append(cc)
-                
-                # 分析可维护性
-                mi = self._get_maintainability_index(temp_path)
-                if mi is not None:
-                    maintainabilities.append(mi)
-                
-                # 检查Lint错误
-                lint = self._get_lint_errors(temp_path)
-                lint_errors += lint
-            finally:
-                # 删除临时文件
-                try:
-                    os.unlink(temp_path)
-                except:
-                    pass
-        
-        avg_complexity = sum(complexities) / len(complexities) if complexities else 1.0
-        avg_mi = sum(maintainabilities) / len(maintainabilities) if maintainabilities else 80.0
+            analyzed = dict(zip(misses, analyzed))
+            results.update(analyzed)
+            # 只缓存完整的分析结果（工具调用失败时不缓存）
+            cacheable = {k: list(v) for k, v in analyzed.items() if None not in v}
+            if cacheable:
+                cache.update(cacheable)
+                while len(cache) > QUALITY_CACHE_MAX_ENTRIES:
+                    cache.popitem(last=False)
+                _save_quality_cache()
+        
+        per_file = [results[key] for key in keys]
+        complexities = [cc for cc, _, _ in per_file if cc is not None]
+        maintainabilities = [mi for _, mi, _ in per_file if mi is not None]
+        lint_errors = sum(lint for _, _, lint in per_file if lint is not None)
+        
+        avg_complexity = fmean(complexities) if complexities else 1.0
+        avg_mi = fmean(maintainabilities) if maintainabilities else 80.0
         
         return avg_complexity, avg_mi, lint_errors
     
-    def _get_cyclomatic_complexity(self, file_path: str) -> Optional[float]:
-        """获取圈复杂度（使用radon）"""
+    def _analyze_source(self, content: str) -> Tuple[float, float, int]:
+        """
+        在进程内分析单段代码，返回 (圈复杂度, 可维护性, Lint错误数)
+        
+        代码只解析一次，语法树供复杂度和 pyflakes 检查共用
+        """
+        try:
+            tree = ast.parse(content)
+        except SyntaxError:
+            # 默认复杂度和可维护性；flake8 对语法错误只报告一条 E999
+            return 1.0, 80.0, 1
+        
+        return (
+            self._get_cyclomatic_complexity(tree),
+            self._get_maintainability_index(content),
+            self._get_lint_errors(content, tree)
+        )
+    
+    def _get_cyclomatic_complexity(self, tree: ast.AST) -> float:
+        """获取圈复杂度（使用radon API）"""
+        # 没有函数和类的代码片段不会产生任何代码块，无需调用 radon
+        if not any(isinstance(node, _BLOCK_NODES) for node in ast.walk(tree)):
+            return 1.0  # 默认复杂度
+        blocks = cc_visit_ast(tree)
+        if not blocks:
+            return 1.0
+        return sum(b.complexity for b in blocks) / len(blocks)
+    
+    def _get_maintainability_index(self, content: str) -> float:
+        """获取可维护性指数（使用radon API）"""
+        return mi_visit(content, multi=True)
+    
+    def _get_lint_errors(self, content: str, tree: ast.AST) -> int:
+        """获取Lint错误数（pyflakes + pycodestyle，等价于 flake8 --select=E,W,F，同样遵循 noqa 注释）"""
+        violations = [
+            (message.lineno, FLAKE8_PYFLAKES_CODES.get(type(message).__name__, 'F'))
+            for message in PyflakesChecker(tree, filename='<code>').messages
+        ]
+        
+        # pycodestyle 遇到 noqa 注释会跳过整行（多行字符串则跳过整段）且不区分错误编号，
+        # 因此先让它看不到这些注释，再与 pyflakes 的结果一起按 flake8 的规则过滤
+        lines = content.splitlines(True)
+        style_lines = lines
+        if _PYCODESTYLE_NOQA_RE.search(content):
+            style_lines = [_PYCODESTYLE_NOQA_RE.sub(r'\1_', line) for line in lines]
+        report = _ViolationReport(_STYLE_GUIDE.options)
+        pycodestyle.Checker(lines=style_lines, options=_STYLE_GUIDE.options, report=report).check_all()
+        violations += report.violations
+        
+        # 代码中没有 noqa 注释时无需逐条过滤
+        if not violations or NOQA_INLINE_REGEXP.search(content) is None:
+            return len(violations)
+        
+        noqa_lines = _noqa_line_mapping(lines)
+        return sum(
+            1 for lineno, code in violations
+            if not _is_inline_ignored(code, noqa_lines.get(lineno) or _physical_line(lines, lineno))
+        )
+    
+    def _analyze_with_cli(self, contents: List[str]) -> List[Tuple[Optional[float], Optional[float], Optional[int]]]:
+        """
+        通过命令行工具分析Python代码（未安装对应库时的回退方案）
+        
+        单段代码直接通过stdin传给工具；多段代码先写入临时文件，
+        再对 radon cc / radon mi / flake8 各调用一次，避免每个文件都启动3个子进程
+        
+        Args:
+            contents: 代码内容列表
+        
+        Returns:
+            每段代码的 (圈复杂度, 可维护性, Lint错误数)，工具调用失败的项为 None
+        """
+        if len(contents) == 1:
+            return self._run_cli_tools([STDIN_PATH], 10, source=contents[0])
+        
+        # 所有代码写入同一个临时目录，退出时整体删除
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_paths = []
+            for i, content in enumerate(contents):
+                temp_path = os.path.join(temp_dir, f"{i}.py")
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                temp_paths.append(temp_path)
+            
+            # 超时时间随文件数增长
+            return self._run_cli_tools(temp_paths, 10 * len(temp_paths))
+    
+    def _run_cli_tools(self, paths: List[str], timeout: float, source: Optional[str] = None) -> List[Tuple[Optional[float], Optional[float], Optional[int]]]:
+        """
+        调用 radon cc / radon mi / flake8 分析给定文件
+        
+        Args:
+            paths: 文件路径列表，为 [STDIN_PATH] 时从 source 读取代码
+            timeout: 每个命令的超时时间（秒）
+            source: 通过stdin传入的代码内容
+        """
+        # 三个工具互不依赖，并发运行以重叠子进程的启动和等待时间
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            cc_future = executor.submit(self._get_cyclomatic_complexities, paths, timeout, source)
+            mi_future = executor.submit(self._get_maintainability_indexes, paths, timeout, source)
+            lint_future = executor.submit(self._get_lint_error_counts, paths, timeout, source)
+            return list(zip(cc_future.result(), mi_future.result(), lint_future.result()))
+    
+    def _get_cyclomatic_complexities(self, paths: List[str], timeout: float, source: Optional[str] = None) -> List[Optional[float]]:
+        """获取每个文件的平均圈复杂度（使用radon）"""
         try:
             result = subprocess.run(
-                ['radon', 'cc', file_path, '-a', '-s'],
+                ['radon', 'cc', '-j', *paths],
+                input=source,
                 capture_output=True,
                 text=True,
-                timeout=10
+                timeout=timeout
             )
-            # 解析输出，找到平均复杂度
-            # 输出格式: "Average complexity: A (1.0)"
-            for line in result.stdout.split('\n'):
-                if 'Average complexity' in line:
-                    # 提取数字
-                    parts = line.split('(')
-                    if len(parts) > 1:
-                        num_str = parts[1].rstrip(')')
-                        return float(num_str)
-            return 1.0  # 默认复杂度
+            # 输出格式: {"path.py": [{"complexity": 2, ...}, ...], ...}
+            data = json.loads(result.stdout)
         except (subprocess.TimeoutExpired, FileNotFoundError, ValueError):
-            return None
+            return [None] * len(paths)
+        
+        complexities = []
+        for path in paths:
+            blocks = data.get(path)
+            if isinstance(blocks, list) and blocks:
+                complexities.append(sum(b['complexity'] for b in blocks) / len(blocks))
+            else:
+                complexities.append(1.0)  # 默认复杂度
+        return complexities
     
-    def _get_maintainability_index(self, file_path: str) -> Optional[float]:
-        """获取可维护性指数（使用radon mi）"""
+    def _get_maintainability_indexes(self, paths: List[str], timeout: float, source: Optional[str] = None) -> List[Optional[float]]:
+        """获取每个文件的可维护性指数（使用radon mi）"""
         try:
             result = subprocess.run(
-                ['radon', 'mi', file_path, '-s'],
+                ['radon', 'mi', '-j', *paths],
+                input=source,
                 capture_output=True,
                 text=True,
-                timeout=10
+                timeout=timeout
             )
-            # 解析输出
-            # 输出格式: "path.py - A (100.00)"
-            for line in result.stdout.split('\n'):
-                if file_path in line or '.py' in line:
-                    parts = line.split('(')
-                    if len(parts) > 1:
-                        num_str = parts[1].rstrip(')')
-                        return float(num_str)
-            return 80.0  # 默认可维护性
+            # 输出格式: {"path.py": {"mi": 100.0, "rank": "A"}, ...}
+            data = json.loads(result.stdout)
         except (subprocess.TimeoutExpired, FileNotFoundError, ValueError):
-            return None
+            return [None] * len(paths)
+        
+        maintainabilities = []
+        for path in paths:
+            entry = data.get(path) or {}
+            maintainabilities.append(float(entry.get('mi', 80.0)))  # 默认可维护性
+        return maintainabilities
     
-    def _get_lint_errors(self, file_path: str) -> int:
-        """获取Lint错误数（使用flake8）"""
+    def _get_lint_error_counts(self, paths: List[str], timeout: float, source: Optional[str] = None) -> List[Optional[int]]:
+        """获取每个文件的Lint错误数（使用flake8）"""
         try:
             result = subprocess.run(
-                ['flake8', file_path, '--count', '--select=E,W,F'],
+                ['flake8', '--exit-zero', '--select=E,W,F', '--format=%(path)s',
+                 f'--stdin-display-name={STDIN_PATH}', *paths],
+                input=source,
                 capture_output=True,
                 text=True,
-                timeout=10
+                timeout=timeout
             )
-            # 统计错误行数
-            if result.stdout.strip():
-                lines = result.stdout.strip().split('\n')
-                # 最后一行是总数
-                try:
-                    return int(lines[-1])
-                except ValueError:
-                    return len(lines)
-            return 0
         except (subprocess.TimeoutExpired, FileNotFoundError):
-            return 0
+            return [None] * len(paths)
+        
+        # 使用 --exit-zero 后，非0退出码只代表 flake8 自身运行失败
+        if result.returncode != 0:
+            return [None] * len(paths)
+        
+        # 每条错误输出一行文件路径
+        counts = Counter(result.stdout.splitlines())
+        return [counts[path] for path in paths]
+
+
+def _physical_line(lines: List[str], lineno: int) -> str:
+    """按行号（从1开始）取物理行，越界时返回空串"""
+    return lines[lineno - 1] if 0 < lineno <= len(lines) else ''
+
+
+def _noqa_line_mapping(lines: List[str]) -> Dict[int, str]:
+    """
+    行号 -> 判断 noqa 时使用的文本（与 flake8 一致）
+    
+    跨多行的语句和字符串，其中每一行都使用整段文本，因此末尾的 noqa 注释对整段生效
+    """
+    mapping = {}
+    min_line, max_line = len(lines) + 2, -1
+    try:
+        for token in tokenize.generate_tokens(iter(lines).__next__):
+            if token.type in (tokenize.ENDMARKER, tokenize.DEDENT):
+                continue
+            min_line = min(min_line, token.start[0])
+            max_line = max(max_line, token.end[0])
+            if token.type in (tokenize.NL, tokenize.NEWLINE):
+                joined = ''.join(lines[min_line - 1:max_line])
+                mapping.update(dict.fromkeys(range(min_line, max_line + 1), joined))
+                min_line, max_line = len(lines) + 2, -1
+    except (tokenize.TokenError, SyntaxError):
+        return {}
+    return mapping
+
+
+def _is_inline_ignored(code: str, line: str) -> bool:
+    """错误是否被所在行的 noqa 注释忽略（无编号时忽略全部，否则按编号或其前缀匹配）"""
+    match = NOQA_INLINE_REGEXP.search(line)
+    if match is None:
+        return False
+    codes_str = match.group('codes')
+    if codes_str is None:
+        return True
+    codes = tuple(parse_comma_separated_list(codes_str))
+    return code in codes or code.startswith(codes)
+
+
+def _content_key(content: str) -> str:
+    """代码内容的缓存键（含缓存格式版本）"""
+    return f"{QUALITY_CACHE_VERSION}:{hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()}"
+
+
+def _load_quality_cache() -> 'OrderedDict[str, list]':
+    """加载代码质量分析缓存（每个进程只读取一次磁盘，文件中的顺序即使用顺序）"""
+    global _quality_cache
+    if _quality_cache is None:
+        _quality_cache = OrderedDict(load_json_cache(QUALITY_CACHE_FILE))
+    return _quality_cache
+
 
+def _save_quality_cache():
+    """写回代码质量分析缓存"""
+    save_json_cache(QUALITY_CACHE_FILE, _quality_cache)
@@ -19,7 +19,7 @@ class CompletionEvaluator(BaseEvaluator):
         return "首次需求完成度"
     
     def evaluate(self, session: SessionData) -> float:
-        prompt_count = len(session.user_prompts)
+        prompt_count = session.prompt_count
         
         if prompt_count <= 1:
             self._raw_value = True
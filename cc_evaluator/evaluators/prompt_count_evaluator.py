@@ -26,7 +26,7 @@ class PromptCountEvaluator(BaseEvaluator):
         optimal = self.config.get('optimal', 1)
         max_count = self.config.get('max_count', 10)
         
-        count = len(session.user_prompts)
+        count = session.prompt_count
         self._raw_value = count
         
         if count <= 0:
@@ -1,7 +1,7 @@
 """
 维度4: 总推理时间评分器
 """
-from ..models import SessionData, MessageType
+from ..models import SessionData
 from .base import BaseEvaluator
 
 
@@ -22,7 +22,6 @@ class TotalTimeEvaluator(BaseEvaluator):
         return "总推理时间"
     
     def evaluate(self, session: SessionData) -> float:
-        from ..config import FILTER_KEYWORDS
         max_time = self.config.get('max_time', 60.0)
         
         if not session.messages:
@@ -30,30 +29,8 @@ class TotalTimeEvaluator(BaseEvaluator):
             self._detail = "无消息记录"
             return 0.0
         
-        # 按时间排序的消息
-        sorted_messages = sorted(session.messages, key=lambda m: m.timestamp)
-        
-        total_time = 0.0
-        last_ts = None
-        last_user_content = None
-        
-        for msg in sorted_messages:
-            # 记录最后一条用户消息内容，用于判断是否为评分请求
-            if msg.msg_type == MessageType.USER and not msg.is_tool_result:
-                last_user_content = msg.content
-
-            if msg.msg_type == MessageType.ASSISTANT and last_ts:
-                # 如果前一条用户消息是评分请求，则忽略这次AI响应的时间
-                if last_user_content and SessionData._is_eval_prompt(last_user_content, FILTER_KEYWORDS):
-                    # 更新时间戳但不仅仅累加时间
-                    pass
-                else:
-                    diff = (msg.timestamp - last_ts).total_seconds()
-                    # 只计算合理范围内的时间差
-                    if 0 < diff < 120:  # 单次响应不超过2分钟
-                        total_time += diff
-            
-            last_ts = msg.timestamp
+        # 解析会话时已在单次遍历中累计（评分请求的响应不计入）
+        total_time = session.total_response_time
         
         self._raw_value = total_time
         
@@ -3,18 +3,24 @@
 Claude Code 评分工具 - 主程序入口
 """
 import argparse
+import contextlib
+import itertools
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 
-from .config import SCORING_CONFIG, CLAUDE_PROJECTS_DIR
-from .models import SessionData, EvaluationResult
+from .config import SCORING_CONFIG
+from .models import SessionData, EvaluationResult, MessageType
 from .parser.session_parser import (
     parse_session_file,
     find_latest_session,
     list_sessions,
-    find_session_files
+    find_session_files,
+    find_session_file,
+    find_recent_session_files
 )
 from .evaluators import (
     ALL_EVALUATORS,
@@ -25,7 +31,19 @@ from .evaluators import (
     CodeSizeEvaluator,
     TaskCompletionEvaluator,
 )
-from .reporter import ScoreReporter, generate_report
+from .reporter import ScoreReporter, generate_report, format_session_list
+
+
+# 评分器实例只依赖固定配置，创建一次后在所有会话间复用
+# （每次 evaluate 都会重新设置 _raw_value/_detail）
+_EVALUATORS = {
+    'first_completion': CompletionEvaluator(SCORING_CONFIG.get('first_completion', {})),
+    'first_time': FirstTimeEvaluator(SCORING_CONFIG.get('first_time', {})),
+    'prompt_count': PromptCountEvaluator(SCORING_CONFIG.get('prompt_count', {})),
+    'total_time': TotalTimeEvaluator(SCORING_CONFIG.get('total_time', {})),
+    'code_size': CodeSizeEvaluator(SCORING_CONFIG.get('code_size', {})),
+    'task_completion': TaskCompletionEvaluator(SCORING_CONFIG.get('task_completion', {})),
+}
 
 
 def evaluate_session(session: SessionData, first_completed: Optional[bool] = None, completion_rate: Optional[float] = None) -> List[EvaluationResult]:
@@ -43,88 +61,85 @@ def evaluate_session(session: SessionData, first_completed: Optional[bool] = Non
     results = []
     
     # 1. 首次需求完成度
-    completion_eval = CompletionEvaluator(SCORING_CONFIG.get('first_completion', {}))
-    is_first_success = False  # 标记是否首次成功
+    completion_eval = _EVALUATORS['first_completion']
+    is_first_success = True  # 标记是否首次成功（该维度禁用时不限制首次完成时间）
 
-    if first_completed is not None:
-        # 手动指定
-        completion_eval._raw_value = first_completed
-        completion_eval._detail = "✓ 用户确认首次完成" if first_completed else "✗ 用户确认首次未完成"
-        
-        score = 1.0 if first_completed else 0.0
-        is_first_success = bool(first_completed)
-        
-        results.append(EvaluationResult(
-            name=completion_eval.name,
-            score=score,
-            weight=completion_eval.weight,
-            raw_value=first_completed,
-            detail=completion_eval._detail
-        ))
-    else:
-        result = completion_eval.get_result(session)
-        is_first_success = (result.score >= 1.0) # 如果得分是1.0，说明判定为成功
-        results.append(result)
+    if completion_eval.enabled:
+        if first_completed is not None:
+            # 手动指定
+            completion_eval._raw_value = first_completed
+            completion_eval._detail = "✓ 用户确认首次完成" if first_completed else "✗ 用户确认首次未完成"
+            
+            score = 1.0 if first_completed else 0.0
+            is_first_success = bool(first_completed)
+            
+            results.append(EvaluationResult(
+                name=completion_eval.name,
+                score=score,
+                weight=completion_eval.weight,
+                raw_value=first_completed,
+                detail=completion_eval._detail
+            ))
+        else:
+            result = completion_eval.get_result(session)
+            is_first_success = (result.score >= 1.0) # 如果得分是1.0，说明判定为成功
+            results.append(result)
     
     # 2. 首次完成时间
-    first_time_eval = FirstTimeEvaluator(SCORING_CONFIG.get('first_time', {}))
-    
-    # 如果首次未完成，首次时间强制为0分
-    if not is_first_success:
-        # 先获取原始结果以拿到时间数据
-        temp_result = first_time_eval.get_result(session)
-        
-        # 覆盖分数
-        first_time_eval._detail = f"{temp_result.detail} (但首次未完成，强制0分)"
-        results.append(EvaluationResult(
-            name=first_time_eval.name,
-            score=0.0,
-            weight=first_time_eval.weight,
-            raw_value=temp_result.raw_value,
-            detail=first_time_eval._detail
-        ))
-    else:
-        results.append(first_time_eval.get_result(session))
-    
-    # 3. 提示词次数
-    prompt_eval = PromptCountEvaluator(SCORING_CONFIG.get('prompt_count', {}))
-    results.append(prompt_eval.get_result(session))
-    
-    # 4. 总推理时间
-    total_time_eval = TotalTimeEvaluator(SCORING_CONFIG.get('total_time', {}))
-    results.append(total_time_eval.get_result(session))
+    first_time_eval = _EVALUATORS['first_time']
+    
+    if first_time_eval.enabled:
+        if not is_first_success:
+            # 如果首次未完成，首次时间强制为0分
+            # 先获取原始结果以拿到时间数据
+            temp_result = first_time_eval.get_result(session)
+            
+            # 覆盖分数
+            first_time_eval._detail = f"{temp_result.detail} (但首次未完成，强制0分)"
+            results.append(EvaluationResult(
+                name=first_time_eval.name,
+                score=0.0,
+                weight=first_time_eval.weight,
+                raw_value=temp_result.raw_value,
+                detail=first_time_eval._detail
+            ))
+        else:
+            results.append(first_time_eval.get_result(session))
     
-    # 5. 代码规模
-    code_size_eval = CodeSizeEvaluator(SCORING_CONFIG.get('code_size', {}))
-    results.append(code_size_eval.get_result(session))
+    # 3. 提示词次数  4. 总推理时间  5. 代码规模
+    for key in ('prompt_count', 'total_time', 'code_size'):
+        evaluator = _EVALUATORS[key]
+        if evaluator.enabled:
+            results.append(evaluator.get_result(session))
     
     # 6. 任务最终完成度
-    task_completion_eval = TaskCompletionEvaluator(SCORING_CONFIG.get('task_completion', {}))
-    if completion_rate is not None:
-        # 手动指定
-        # 更新配置中的默认值，以便 evaluate 方法使用
-        task_completion_eval.config['completion_rate'] = float(completion_rate)
-    results.append(task_completion_eval.get_result(session))
+    task_completion_eval = _EVALUATORS['task_completion']
+    if task_completion_eval.enabled:
+        if completion_rate is not None:
+            # 手动指定：用带该完成度的配置单独创建评分器，不改动共享实例的配置
+            task_completion_eval = TaskCompletionEvaluator(
+                {**task_completion_eval.config, 'completion_rate': float(completion_rate)}
+            )
+        results.append(task_completion_eval.get_result(session))
     
     return results
 
 
+def _require_session_file(session_id: str) -> Path:
+    """按会话ID查找会话文件，找不到时报错退出"""
+    session_file = find_session_file(session_id)
+    if not session_file:
+        print(f"错误: 找不到会话 {session_id}")
+        sys.exit(1)
+    return session_file
+
+
 def cmd_evaluate(args):
     """评估命令"""
     # 确定要评估的会话文件
     if args.session:
         # 指定会话ID
-        session_file = None
-        for project_dir in CLAUDE_PROJECTS_DIR.iterdir():
-            if project_dir.is_dir():
-                candidate = project_dir / f"{args.session}.jsonl"
-                if candidate.exists():
-                    session_file = candidate
-                    break
-        
-        if not session_file:
-            print(f"错误: 找不到会话 {args.session}")
-            sys.exit(1)
+        session_file = _require_session_file(args.session)
     elif args.latest:
         # 最新会话
         session_file = find_latest_session(args.project)
@@ -148,7 +163,7 @@ def cmd_evaluate(args):
     session = parse_session_file(session_file, include_agents=not args.no_agents)
     
     if not args.quiet:
-        print(f"  - 用户提示词: {len(session.user_prompts)} 条")
+        print(f"  - 用户提示词: {session.prompt_count} 条")
         print(f"  - AI回复: {len(session.assistant_responses)} 条")
         print(f"  - 代码操作: {len(session.code_operations)} 个")
         print(f"  - 代码行数: {session.total_lines} 行")
@@ -205,6 +220,68 @@ def cmd_evaluate(args):
         print(f"\n报告已保存到: {output_path}")
 
 
+def _evaluate_file(session_file: Path, include_agents: bool = True) -> Dict[str, Any]:
+    """
+    解析并评估单个会话文件（供 batch 命令在子进程中调用）
+    
+    只返回汇总字段和JSON报告，避免把整个会话数据传回主进程；
+    评估出错时返回带 error 字段的结果，不中断整批评估
+    """
+    try:
+        session = parse_session_file(session_file, include_agents=include_agents)
+        results = evaluate_session(session)
+        report = generate_report(session, results)
+        return {
+            'session_id': session.session_id,
+            'prompt_count': session.prompt_count,
+            'total_lines': session.total_lines,
+            'total_score': report.total_score,
+            'report_json': ScoreReporter(report, session).to_json(),
+        }
+    except Exception as e:  # 单个会话数据异常（如字段类型不符）
+        return {'session_id': session_file.stem, 'error': f"{type(e).__name__}: {e}"}
+
+
+def cmd_batch(args):
+    """批量评估命令"""
+    session_files = find_recent_session_files(args.project, args.limit)
+    if not session_files:
+        print("没有找到任何会话")
+        return
+    
+    output_dir = Path(args.output) if args.output else None
+    if output_dir:
+        output_dir.mkdir(parents=True, exist_ok=True)
+    
+    print(f"共评估 {len(session_files)} 个会话:\n")
+    print(f"{'序号':<4} {'会话ID':<38} {'提示词':<6} {'代码行数':<8} {'综合得分':<8}")
+    print("-" * 80)
+    
+    include_agents = not args.no_agents
+    workers = min(args.workers or os.cpu_count() or 1, len(session_files))
+    failed = 0
+    # 解析和评分是CPU密集型，用多进程绕开GIL；结果按顺序逐个到达，到达即输出和保存
+    with ProcessPoolExecutor(max_workers=workers) if workers > 1 else contextlib.nullcontext() as executor:
+        outcomes = (executor.map if executor else map)(
+            _evaluate_file, session_files, itertools.repeat(include_agents)
+        )
+        for i, outcome in enumerate(outcomes, 1):
+            session_id = outcome['session_id']
+            if 'error' in outcome:
+                failed += 1
+                print(f"{i:<4} {session_id[:36]:<38} 评估失败: {outcome['error']}")
+                continue
+            print(f"{i:<4} {session_id[:36]:<38} {outcome['prompt_count']:<6} {outcome['total_lines']:<8} {outcome['total_score']:<8.3f}")
+            if output_dir:
+                with open(output_dir / f"{session_id}.json", 'w', encoding='utf-8') as f:
+                    f.write(outcome['report_json'])
+    
+    if failed:
+        print(f"\n{failed} 个会话评估失败")
+    if output_dir:
+        print(f"\n报告已保存到: {output_dir}")
+
+
 def cmd_list(args):
     """列出会话命令"""
     sessions = list_sessions(args.project, args.limit)
@@ -214,30 +291,13 @@ def cmd_list(args):
         return
     
     print(f"找到 {len(sessions)} 个会话:\n")
-    print(f"{'序号':<4} {'会话ID':<38} {'修改时间':<20} {'摘要':<30}")
-    print("-" * 100)
-    
-    for i, s in enumerate(sessions, 1):
-        session_id = s['session_id'][:36]
-        modified = s['modified'].strftime('%Y-%m-%d %H:%M:%S')
-        summary = s['summary'][:30] if s['summary'] else "(无摘要)"
-        print(f"{i:<4} {session_id:<38} {modified:<20} {summary:<30}")
+    print(format_session_list(sessions))
 
 
 def cmd_info(args):
     """显示会话详情"""
     # 查找会话文件
-    session_file = None
-    for project_dir in CLAUDE_PROJECTS_DIR.iterdir():
-        if project_dir.is_dir():
-            candidate = project_dir / f"{args.session}.jsonl"
-            if candidate.exists():
-                session_file = candidate
-                break
-    
-    if not session_file:
-        print(f"错误: 找不到会话 {args.session}")
-        sys.exit(1)
+    session_file = _require_session_file(args.session)
     
     # 解析会话
     session = parse_session_file(session_file)
@@ -245,7 +305,7 @@ def cmd_info(args):
     print(f"会话ID: {session.session_id}")
     print(f"项目: {session.project_path}")
     print(f"消息总数: {len(session.messages)}")
-    print(f"用户提示词: {len(session.user_prompts)} 条")
+    print(f"用户提示词: {session.prompt_count} 条")
     print(f"AI回复: {len(session.assistant_responses)} 条")
     print(f"代码操作: {len(session.code_operations)} 个")
     print(f"代码行数: {session.total_lines} 行")
@@ -258,7 +318,7 @@ def cmd_info(args):
     print("\n=== 对话内容 ===\n")
     for msg in session.messages[:20]:  # 只显示前20条
         ts = msg.timestamp.strftime('%H:%M:%S')
-        if msg.msg_type.value == 'user':
+        if msg.msg_type is MessageType.USER:
             content = msg.content[:80] if msg.content else "(tool_result)"
             print(f"[{ts}] 👤 USER: {content}")
         else:
@@ -279,6 +339,7 @@ def main():
   cc-eval --session <id>              评估指定会话
   cc-eval --latest --format json      输出JSON格式
   cc-eval list                        列出所有会话
+  cc-eval batch -n 20 -o reports/     批量评估最近20个会话
   cc-eval info <session_id>           显示会话详情
         """
     )
@@ -304,6 +365,14 @@ def main():
     list_parser.add_argument('--project', '-p', help='项目路径')
     list_parser.add_argument('--limit', '-n', type=int, default=10, help='显示数量')
     
+    # 批量评估命令
+    batch_parser = subparsers.add_parser('batch', help='批量评估会话')
+    batch_parser.add_argument('--project', '-p', help='项目路径')
+    batch_parser.add_argument('--limit', '-n', type=int, default=10, help='评估数量（按修改时间从新到旧）')
+    batch_parser.add_argument('--output', '-o', help='报告输出目录（每个会话一个JSON文件）')
+    batch_parser.add_argument('--workers', '-j', type=int, help='并行进程数（默认为CPU核数）')
+    batch_parser.add_argument('--no-agents', action='store_true', help='不包含agent文件')
+    
     # 详情命令
     info_parser = subparsers.add_parser('info', help='显示会话详情')
     info_parser.add_argument('session', help='会话ID')
@@ -323,6 +392,8 @@ def main():
         cmd_evaluate(args)
     elif args.command == 'list':
         cmd_list(args)
+    elif args.command == 'batch':
+        cmd_batch(args)
     elif args.command == 'info':
         cmd_info(args)
     else:
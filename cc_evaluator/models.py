@@ -1,8 +1,12 @@
 """
 数据模型定义
 """
+import os
+import re
 from dataclasses import dataclass, field
 from datetime import datetime
+from functools import cached_property, lru_cache
+from itertools import pairwise
 from typing import List, Dict, Optional, Any
 from enum import Enum
 
@@ -24,7 +28,17 @@ class ToolType(Enum):
     OTHER = "other"
 
 
-@dataclass
+@lru_cache(maxsize=None)
+def _compile_keywords(keywords: tuple) -> "re.Pattern":
+    """将关键词列表编译为一个忽略大小写的正则，一次扫描即可匹配所有关键词"""
+    return re.compile('|'.join(re.escape(k) for k in keywords), re.IGNORECASE)
+
+
+# warmup 消息检测（忽略大小写，避免对整条内容做 lower() 拷贝）
+_WARMUP_RE = re.compile('warmup', re.IGNORECASE)
+
+
+@dataclass(slots=True)
 class ToolUse:
     """工具调用记录"""
     name: str
@@ -35,7 +49,7 @@ class ToolUse:
     lines: int = 0
 
 
-@dataclass
+@dataclass(slots=True)
 class Message:
     """消息记录"""
     uuid: str
@@ -53,7 +67,7 @@ class Message:
     is_sidechain: bool = False
 
 
-@dataclass
+@dataclass(slots=True)
 class CodeOperation:
     """代码操作记录"""
     tool_type: ToolType
@@ -61,6 +75,10 @@ class CodeOperation:
     content: str
     lines: int
     timestamp: datetime
+    ext: str = field(init=False)  # 小写文件扩展名，如 '.py'
+    
+    def __post_init__(self):
+        self.ext = os.path.splitext(self.file_path)[1].lower()
 
 
 @dataclass
@@ -74,47 +92,86 @@ class SessionData:
     # 派生数据
     user_prompts: List[Message] = field(default_factory=list)
     assistant_responses: List[Message] = field(default_factory=list)
+    prompt_count: int = 0  # 真实用户提示词数量
     first_user_ts: Optional[datetime] = None
     first_assistant_ts: Optional[datetime] = None
     total_lines: int = 0
+    total_response_time: float = 0.0  # 秒，所有AI响应耗时之和
+    python_operations: List[CodeOperation] = field(default_factory=list)
+    
+    @cached_property
+    def sorted_messages(self) -> List[Message]:
+        """按时间排序的消息（解析器已排好序，只有乱序时才重新排序）"""
+        if any(a.timestamp > b.timestamp for a, b in pairwise(self.messages)):
+            return sorted(self.messages, key=lambda m: m.timestamp)
+        return self.messages
     
     @staticmethod
-    def _is_eval_prompt(content: Optional[str], keywords: List[str]) -> bool:
-        """判断是否为评分相关的提示词"""
-        if not content:
+    def _is_eval_prompt(content: Optional[str], pattern: Optional["re.Pattern"]) -> bool:
+        """判断是否为评分相关的提示词（pattern 为编译后的关键词正则，无关键词时为None）"""
+        if not content or pattern is None:
             return False
-        content_lower = content.lower()
-        return any(keyword.lower() in content_lower for keyword in keywords)
+        return pattern.search(content) is not None
     
     def compute_derived_data(self):
         """计算派生数据"""
         from .config import FILTER_KEYWORDS
         
-        # 过滤真实用户提示词（排除 tool_result、warmup、sidechain、评分相关）
-        self.user_prompts = [
-            m for m in self.messages 
-            if (m.msg_type == MessageType.USER and 
-                not m.is_tool_result and 
-                not m.is_sidechain and
-                not (m.content and 'warmup' in m.content.lower()) and
-                not self._is_eval_prompt(m.content, FILTER_KEYWORDS))
-        ]
+        messages = self.sorted_messages
+        eval_pattern = _compile_keywords(tuple(FILTER_KEYWORDS)) if FILTER_KEYWORDS else None
+        
+        # 单次遍历同时计算真实用户提示词、AI响应和总推理时间
+        user_prompts = []
+        assistant_responses = []
+        total_response_time = 0.0
+        last_ts = None
+        after_eval_prompt = False  # 最近一条用户消息是否为评分请求
+        
+        for m in messages:
+            if m.msg_type is MessageType.USER:
+                if not m.is_tool_result:
+                    after_eval_prompt = self._is_eval_prompt(m.content, eval_pattern)
+                    # 过滤真实用户提示词（排除 tool_result、warmup、sidechain、评分相关）
+                    if (not m.is_sidechain and
+                            not (m.content and _WARMUP_RE.search(m.content)) and
+                            not after_eval_prompt):
+                        user_prompts.append(m)
+            elif m.msg_type is MessageType.ASSISTANT:
+                # AI响应（排除 sidechain，只保留真实回复）
+                # 修复：确保排除Agent warmup消息 (is_sidechain=True)
+                if not m.is_sidechain:
+                    assistant_responses.append(m)
+                
+                # 累加AI响应与前一条消息的时间差，评分请求的响应不计入
+                if last_ts and not after_eval_prompt:
+                    diff = (m.timestamp - last_ts).total_seconds()
+                    # 只计算合理范围内的时间差
+                    if 0 < diff < 120:  # 单次响应不超过2分钟
+                        total_response_time += diff
+            
+            last_ts = m.timestamp
+        
+        self.user_prompts = user_prompts
+        self.prompt_count = len(user_prompts)
+        self.assistant_responses = assistant_responses
+        self.total_response_time = total_response_time
         
-        # AI响应（排除 sidechain，只保留真实回复）
-        # 修复：确保排除Agent warmup消息 (is_sidechain=True)
-        self.assistant_responses = [
-            m for m in self.messages 
-            if m.msg_type == MessageType.ASSISTANT and not m.is_sidechain
-        ]
+        # 首次时间（基于真实用户提示词和真实AI回复，已按时间顺序）
+        if user_prompts:
+            self.first_user_ts = user_prompts[0].timestamp
+        if assistant_responses:
+            self.first_assistant_ts = assistant_responses[0].timestamp
         
-        # 首次时间（基于真实用户提示词和真实AI回复）
-        if self.user_prompts:
-            self.first_user_ts = min(m.timestamp for m in self.user_prompts)
-        if self.assistant_responses:
-            self.first_assistant_ts = min(m.timestamp for m in self.assistant_responses)
+        # 单次遍历代码操作：总代码行数 + 有内容的Python代码操作（供代码质量分析使用）
+        total_lines = 0
+        python_operations = []
+        for op in self.code_operations:
+            total_lines += op.lines
+            if op.content and op.ext == '.py':
+                python_operations.append(op)
         
-        # 总代码行数
-        self.total_lines = sum(op.lines for op in self.code_operations)
+        self.total_lines = total_lines
+        self.python_operations = python_operations
 
 
 @dataclass
@@ -2,13 +2,17 @@ from .session_parser import (
     parse_session_file,
     find_latest_session,
     list_sessions,
-    find_session_files
+    find_session_files,
+    find_session_file,
+    find_recent_session_files
 )
 
 __all__ = [
     'parse_session_file',
     'find_latest_session',
     'list_sessions',
-    'find_session_files'
+    'find_session_files',
+    'find_session_file',
+    'find_recent_session_files'
 ]
 
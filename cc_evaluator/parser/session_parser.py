@@ -1,21 +1,83 @@
 """
 Claude Code 会话日志解析器
 """
+import contextlib
+import itertools
 import json
 import glob
+import heapq
+import os
+import re
+import time
 from pathlib import Path
 from datetime import datetime
+from functools import lru_cache
 from typing import List, Optional, Dict, Any, Tuple
 
 from ..models import (
     Message, MessageType, ToolUse, ToolType, 
     CodeOperation, SessionData
 )
-from ..config import CLAUDE_PROJECTS_DIR
+from ..cache import load_json_cache, save_json_cache, load_pickle_cache, save_pickle_cache, prune_cache_dir
+from ..config import CLAUDE_PROJECTS_DIR, CACHE_DIR, FILTER_KEYWORDS
 
+# 会话文件索引: {会话ID: 文件路径}
+SESSION_INDEX_FILE = CACHE_DIR / "session_index.json"
+_session_index: Dict[str, str] = {}  # 进程内的会话索引副本
 
+# 解析结果缓存目录（每个会话一个pickle文件，按源文件修改时间和大小失效）
+SESSION_CACHE_DIR = CACHE_DIR / "sessions"
+
+# 解析结果缓存格式版本，models 中数据结构变化时需递增
+SESSION_CACHE_VERSION = 1
+
+# 源文件在该秒数内有修改的会话（通常是正在进行的会话）不缓存，避免每次都写入即失效的缓存
+SESSION_CACHE_MIN_AGE = 300
+
+# 解析结果缓存最多保留的文件数，超出时删除最旧的
+SESSION_CACHE_MAX_FILES = 200
+
+# agent文件索引: {文件路径: {"mtime_ns": 修改时间, "session_id": 所属会话}}
+AGENT_INDEX_FILE = CACHE_DIR / "agent_index.json"
+
+# 消息记录类型 -> MessageType（其余类型如 summary、queue-operation 等跳过）
+_MESSAGE_TYPES = {'user': MessageType.USER, 'assistant': MessageType.ASSISTANT}
+
+# 产生代码的工具名 -> ToolType
+_CODE_TOOL_TYPES = {
+    'Write': ToolType.WRITE,
+    'Edit': ToolType.EDIT,
+    'search_replace': ToolType.SEARCH_REPLACE,
+}
+
+# 读取会话摘要时最多扫描的行数
+SUMMARY_SCAN_LINES = 50
+
+# 可能是 summary/user 记录的行（通过此检查后才做JSON解析）
+_SUMMARY_CANDIDATE_RE = re.compile(rb'"type"\s*:\s*"(?:summary|user)"')
+
+# 优先使用 orjson（C实现，解析速度快数倍），未安装时回退到标准库
+try:
+    import orjson
+    
+    def _json_loads(data):
+        """
+        解析一条JSON记录
+        
+        orjson 比标准库严格，会拒绝单独的代理对转义（如被截断的 "\\ud83d"）和 NaN 等，
+        这些记录交给 json.loads 重新解析，保证结果与标准库一致、不丢记录
+        """
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return json.loads(data)
+except ImportError:
+    _json_loads = json.loads
+
+
+@lru_cache(maxsize=16384)
 def parse_timestamp(ts_str: str) -> Optional[datetime]:
-    """解析ISO格式时间戳"""
+    """解析ISO格式时间戳（相邻记录常共用同一时间戳，结果缓存复用）"""
     if not ts_str:
         return None
     try:
@@ -33,36 +95,118 @@ def get_project_dir(project_path: str) -> Path:
     return CLAUDE_PROJECTS_DIR / f"-{dir_name}"
 
 
+def _is_session_entry(entry: os.DirEntry) -> bool:
+    """是否为主会话文件（排除 agent-*.jsonl）"""
+    name = entry.name
+    return name.endswith('.jsonl') and not name.startswith('agent-')
+
+
+def _scan_session_entries(project_path: Optional[str] = None) -> List[os.DirEntry]:
+    """
+    用 os.scandir 收集主会话文件的目录项
+    
+    DirEntry 会缓存 stat() 结果，按修改时间排序和读取文件大小时不会重复调用系统stat
+    
+    Args:
+        project_path: 项目路径，如果为None则搜索所有项目
+    """
+    if project_path:
+        project_dir = get_project_dir(project_path)
+        if not project_dir.exists():
+            # 尝试直接使用目录名
+            project_dir = CLAUDE_PROJECTS_DIR / project_path
+        if not project_dir.exists():
+            return []
+        project_dirs = [project_dir]
+    else:
+        with os.scandir(CLAUDE_PROJECTS_DIR) as it:
+            project_dirs = [entry.path for entry in it if entry.is_dir()]
+    
+    entries = []
+    for project_dir in project_dirs:
+        with os.scandir(project_dir) as it:
+            entries.extend(entry for entry in it if _is_session_entry(entry))
+    return entries
+
+
 def find_session_files(project_path: str) -> List[Path]:
     """查找项目下所有会话文件"""
-    project_dir = get_project_dir(project_path)
-    if not project_dir.exists():
-        # 尝试直接使用目录名
-        project_dir = CLAUDE_PROJECTS_DIR / project_path
+    # 排除 agent-*.jsonl 文件，只返回主会话文件
+    return [Path(entry.path) for entry in _scan_session_entries(project_path)]
+
+
+def find_session_file(session_id: str) -> Optional[Path]:
+    """
+    按会话ID查找会话文件（在所有项目目录中查找）
     
-    if not project_dir.exists():
-        return []
+    会话ID到文件路径的映射缓存在磁盘索引中（并在进程内保留，供 MCP Server 等常驻进程复用）；
+    索引未命中或记录的文件已不存在时，重新扫描所有项目目录并重建索引
+    """
+    if not _session_index:
+        _session_index.update(load_json_cache(SESSION_INDEX_FILE))
+    cached = _session_index.get(session_id)
+    if cached and os.path.isfile(cached):
+        return Path(cached)
     
-    # 排除 agent-*.jsonl 文件，只返回主会话文件
-    return [
-        f for f in project_dir.glob("*.jsonl")
-        if not f.name.startswith("agent-")
-    ]
+    if not CLAUDE_PROJECTS_DIR.is_dir():
+        return None
+    
+    index = {}
+    for entry in _scan_session_entries():
+        index.setdefault(entry.name[:-len('.jsonl')], entry.path)
+    # 重新扫描结果与现有索引一致时（如查找不存在的会话ID）不重写磁盘索引
+    if index != _session_index:
+        save_json_cache(SESSION_INDEX_FILE, index)
+        _session_index.clear()
+        _session_index.update(index)
+    
+    found = index.get(session_id)
+    return Path(found) if found else None
 
 
 def find_agent_files(project_dir: Path, session_id: str) -> List[Path]:
-    """查找与指定session关联的agent文件"""
+    """
+    查找与指定session关联的agent文件
+    
+    每个agent文件所属的sessionId缓存在磁盘索引中（按文件修改时间失效），
+    只有新增或修改过的agent文件才需要重新读取首行
+    """
+    index = load_json_cache(AGENT_INDEX_FILE)
+    index_changed = False
     agent_files = []
+    seen = set()
+    
     for f in project_dir.glob("agent-*.jsonl"):
+        key = str(f)
+        seen.add(key)
         try:
-            with open(f, 'r', encoding='utf-8') as fp:
-                first_line = fp.readline()
-                if first_line:
-                    data = json.loads(first_line)
-                    if data.get('sessionId') == session_id:
-                        agent_files.append(f)
-        except (json.JSONDecodeError, IOError):
+            mtime_ns = f.stat().st_mtime_ns
+        except OSError:
             continue
+        
+        entry = index.get(key)
+        if entry is None or entry.get('mtime_ns') != mtime_ns:
+            try:
+                with open(f, 'r', encoding='utf-8') as fp:
+                    first_line = fp.readline()
+                data = _json_loads(first_line) if first_line else {}
+            except (ValueError, IOError):  # json.JSONDecodeError 是 ValueError 的子类
+                continue
+            entry = {'mtime_ns': mtime_ns, 'session_id': data.get('sessionId')}
+            index[key] = entry
+            index_changed = True
+        
+        if entry['session_id'] == session_id:
+            agent_files.append(f)
+    
+    # 清理该目录下已删除文件的索引
+    project_dir_str = str(project_dir)
+    for key in [k for k in index if os.path.dirname(k) == project_dir_str and k not in seen]:
+        del index[key]
+        index_changed = True
+    
+    if index_changed:
+        save_json_cache(AGENT_INDEX_FILE, index)
     return agent_files
 
 
@@ -82,11 +226,11 @@ def parse_tool_use(content_item: Dict[str, Any]) -> Optional[ToolUse]:
     )
     
     # 提取文件路径和内容（针对 Write/Edit 操作）
-    if name in ('Write', 'Edit', 'search_replace'):
+    if name in _CODE_TOOL_TYPES:
         tool_use.file_path = input_data.get('file_path', '')
         tool_use.content = input_data.get('content', '') or input_data.get('new_string', '')
         if tool_use.content:
-            tool_use.lines = len(tool_use.content.split('\n'))
+            tool_use.lines = tool_use.content.count('\n') + 1
     
     return tool_use
 
@@ -97,13 +241,16 @@ def parse_message_content(msg_data: Dict[str, Any]) -> Tuple[Optional[str], List
     返回: (文本内容, 工具调用列表, 是否为tool_result)
     """
     content = msg_data.get('content')
+    
+    # 快速路径：纯文本内容（大部分用户提示词）直接返回
+    if type(content) is str:
+        return content, [], False
+    
     tool_uses = []
     text_content = None
     is_tool_result = False
     
-    if isinstance(content, str):
-        text_content = content
-    elif isinstance(content, list):
+    if isinstance(content, list):
         texts = []
         for item in content:
             if isinstance(item, dict):
@@ -126,21 +273,76 @@ def parse_message_content(msg_data: Dict[str, Any]) -> Tuple[Optional[str], List
 
 def parse_jsonl_file(file_path: Path) -> List[Dict[str, Any]]:
     """解析JSONL文件"""
+    # 以二进制模式逐行读取，UTF-8解码交给JSON解析器完成（省去逐行的文本解码）
     records = []
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
+        with open(file_path, 'rb') as f:
             for line in f:
                 line = line.strip()
                 if line:
                     try:
-                        records.append(json.loads(line))
-                    except json.JSONDecodeError:
+                        records.append(_json_loads(line))
+                    except ValueError:  # 包括 JSONDecodeError 和非法UTF-8导致的 UnicodeDecodeError
                         continue
     except IOError:
         return []
     return records
 
 
+def records_to_messages(records: List[Dict[str, Any]]) -> List[Message]:
+    """将JSONL记录转换为Message对象（跳过非消息记录和无时间戳的记录）"""
+    messages = []
+    append = messages.append  # 热循环中避免重复属性查找
+    for record in records:
+        # 跳过非消息类型
+        msg_type = _MESSAGE_TYPES.get(record.get('type'))
+        if msg_type is None:
+            continue
+        
+        msg_data = record.get('message', {})
+        timestamp = parse_timestamp(record.get('timestamp'))
+        
+        if not timestamp:
+            continue
+        
+        text_content, tool_uses, is_tool_result = parse_message_content(msg_data)
+        
+        append(Message(
+            uuid=record.get('uuid', ''),
+            parent_uuid=record.get('parentUuid'),
+            msg_type=msg_type,
+            timestamp=timestamp,
+            role=msg_data.get('role'),
+            content=text_content,
+            model=msg_data.get('model'),
+            tool_uses=tool_uses,
+            usage=msg_data.get('usage'),
+            is_tool_result=is_tool_result,
+            session_id=record.get('sessionId'),
+            agent_id=record.get('agentId'),
+            is_sidechain=record.get('isSidechain', False)
+        ))
+    return messages
+
+
+def _session_cache_key(jsonl_files: List[Path]) -> Optional[tuple]:
+    """
+    解析结果缓存键：各源文件的路径、修改时间和大小（派生数据依赖的过滤关键词也计入）
+    
+    源文件无法访问或最近仍有修改时返回None（不使用缓存）
+    """
+    try:
+        files = tuple(
+            (str(f), st.st_mtime_ns, st.st_size)
+            for f, st in ((f, f.stat()) for f in jsonl_files)
+        )
+    except OSError:
+        return None
+    if time.time_ns() - max(mtime_ns for _, mtime_ns, _ in files) < SESSION_CACHE_MIN_AGE * 10**9:
+        return None
+    return (SESSION_CACHE_VERSION, tuple(FILTER_KEYWORDS), files)
+
+
 def parse_session_file(file_path: Path, include_agents: bool = True) -> SessionData:
     """
     解析单个会话文件
@@ -165,71 +367,55 @@ def parse_session_file(file_path: Path, include_agents: bool = True) -> SessionD
         project_path=project_path
     )
     
-    # 解析主会话文件
-    records = parse_jsonl_file(file_path)
+    # 解析主会话文件（如果需要，也解析关联的agent文件）
+    agent_files = find_agent_files(project_dir, session_id) if include_agents else []
     
-    # 如果需要，也解析关联的agent文件
-    if include_agents:
-        agent_files = find_agent_files(project_dir, session_id)
-        for agent_file in agent_files:
-            records.extend(parse_jsonl_file(agent_file))
+    # 源文件未变化时直接复用上次的解析结果
+    cache_file = SESSION_CACHE_DIR / (f"{session_id}.pkl" if include_agents else f"{session_id}.main.pkl")
+    cache_key = _session_cache_key([file_path] + agent_files)
+    if cache_key is not None:
+        cached = load_pickle_cache(cache_file, cache_key)
+        if cached is not None:
+            return cached
     
-    # 转换为Message对象
-    for record in records:
-        rec_type = record.get('type', '')
-        
-        # 跳过非消息类型
-        if rec_type in ('queue-operation', 'file-history-snapshot', 'summary'):
-            continue
-        
-        if rec_type not in ('user', 'assistant'):
-            continue
-        
-        msg_data = record.get('message', {})
-        timestamp = parse_timestamp(record.get('timestamp'))
-        
-        if not timestamp:
-            continue
-        
-        text_content, tool_uses, is_tool_result = parse_message_content(msg_data)
-        
-        msg = Message(
-            uuid=record.get('uuid', ''),
-            parent_uuid=record.get('parentUuid'),
-            msg_type=MessageType.USER if rec_type == 'user' else MessageType.ASSISTANT,
-            timestamp=timestamp,
-            role=msg_data.get('role'),
-            content=text_content,
-            model=msg_data.get('model'),
-            tool_uses=tool_uses,
-            usage=msg_data.get('usage'),
-            is_tool_result=is_tool_result,
-            session_id=record.get('sessionId'),
-            agent_id=record.get('agentId'),
-            is_sidechain=record.get('isSidechain', False)
-        )
-        
-        session.messages.append(msg)
-        
-        # 提取代码操作
-        for tool_use in tool_uses:
-            if tool_use.name in ('Write', 'Edit', 'search_replace') and tool_use.file_path:
+    # 每个文件内的消息通常已按时间排列，只对乱序的文件排序，再归并各文件（稳定，等价于整体排序）
+    # 每个文件解析完立即转换，原始记录（含完整的 tool_result 等大字段）随即释放，
+    # 同一时刻只有一个文件的原始记录驻留内存
+    runs = []
+    for jsonl_file in [file_path] + agent_files:
+        messages = records_to_messages(parse_jsonl_file(jsonl_file))
+        if any(a.timestamp > b.timestamp for a, b in itertools.pairwise(messages)):
+            messages.sort(key=lambda m: m.timestamp)
+        runs.append(messages)
+    
+    if len(runs) == 1:
+        session.messages = runs[0]
+    else:
+        session.messages = list(heapq.merge(*runs, key=lambda m: m.timestamp))
+    
+    # 按消息顺序提取代码操作（已按时间排序）
+    code_operations = []
+    op_append = code_operations.append
+    for msg in session.messages:
+        for tool_use in msg.tool_uses:
+            tool_type = _CODE_TOOL_TYPES.get(tool_use.name)
+            if tool_type is not None and tool_use.file_path:
                 op = CodeOperation(
-                    tool_type=ToolType[tool_use.name.upper()] if tool_use.name.upper() in ToolType.__members__ else ToolType.OTHER,
+                    tool_type=tool_type,
                     file_path=tool_use.file_path,
                     content=tool_use.content or '',
                     lines=tool_use.lines,
-                    timestamp=timestamp
+                    timestamp=msg.timestamp
                 )
-                session.code_operations.append(op)
-    
-    # 按时间排序
-    session.messages.sort(key=lambda m: m.timestamp)
-    session.code_operations.sort(key=lambda o: o.timestamp)
+                op_append(op)
+    session.code_operations = code_operations
     
     # 计算派生数据
     session.compute_derived_data()
     
+    if cache_key is not None:
+        save_pickle_cache(cache_file, cache_key, session)
+        prune_cache_dir(SESSION_CACHE_DIR, "*.pkl", SESSION_CACHE_MAX_FILES)
     return session
 
 
@@ -243,23 +429,48 @@ def find_latest_session(project_path: Optional[str] = None) -> Optional[Path]:
     Returns:
         最新会话文件的路径
     """
-    if project_path:
-        session_files = find_session_files(project_path)
-    else:
-        # 搜索所有项目
-        session_files = []
-        for project_dir in CLAUDE_PROJECTS_DIR.iterdir():
-            if project_dir.is_dir():
-                session_files.extend([
-                    f for f in project_dir.glob("*.jsonl")
-                    if not f.name.startswith("agent-")
-                ])
-    
-    if not session_files:
+    entries = _scan_session_entries(project_path)
+    if not entries:
         return None
     
     # 按修改时间排序，返回最新的
-    return max(session_files, key=lambda f: f.stat().st_mtime)
+    return Path(max(entries, key=lambda e: e.stat().st_mtime).path)
+
+
+def find_recent_session_files(project_path: Optional[str] = None, limit: int = 10) -> List[Path]:
+    """
+    按修改时间从新到旧返回会话文件
+    
+    Args:
+        project_path: 项目路径，如果为None则搜索所有项目
+        limit: 返回数量限制
+    """
+    entries = _scan_session_entries(project_path)
+    entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+    return [Path(entry.path) for entry in entries[:limit]]
+
+
+def read_session_summary(file_path: Path) -> str:
+    """
+    快速读取会话摘要（summary 记录，或首条文本形式的用户提示词）
+    
+    只扫描文件开头若干行，以二进制方式读取（不逐行做UTF-8解码），
+    且只对可能是 summary/user 记录的行做JSON解析
+    """
+    # 读取失败或遇到损坏的行时放弃摘要，不影响列表
+    with contextlib.suppress(OSError, ValueError, AttributeError):
+        with open(file_path, 'rb') as fp:
+            for line in itertools.islice(fp, SUMMARY_SCAN_LINES):
+                if not _SUMMARY_CANDIDATE_RE.search(line):
+                    continue
+                data = _json_loads(line)
+                if data.get('type') == 'summary':
+                    return data.get('summary', '')
+                elif data.get('type') == 'user':
+                    content = data.get('message', {}).get('content', '')
+                    if isinstance(content, str):
+                        return content[:50]
+    return ""
 
 
 def list_sessions(project_path: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
@@ -273,46 +484,23 @@ def list_sessions(project_path: Optional[str] = None, limit: int = 10) -> List[D
     Returns:
         会话信息列表
     """
-    if project_path:
-        session_files = find_session_files(project_path)
-    else:
-        session_files = []
-        for project_dir in CLAUDE_PROJECTS_DIR.iterdir():
-            if project_dir.is_dir():
-                session_files.extend([
-                    f for f in project_dir.glob("*.jsonl")
-                    if not f.name.startswith("agent-")
-                ])
+    entries = _scan_session_entries(project_path)
     
     # 按修改时间排序
-    session_files.sort(key=lambda f: f.stat().st_mtime, reverse=True)
+    entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
     
     sessions = []
-    for f in session_files[:limit]:
-        # 快速读取首条摘要
-        summary = ""
-        try:
-            with open(f, 'r', encoding='utf-8') as fp:
-                for line in fp:
-                    data = json.loads(line)
-                    if data.get('type') == 'summary':
-                        summary = data.get('summary', '')
-                        break
-                    elif data.get('type') == 'user':
-                        content = data.get('message', {}).get('content', '')
-                        if isinstance(content, str):
-                            summary = content[:50]
-                            break
-        except:
-            pass
+    for entry in entries[:limit]:
+        f = Path(entry.path)
+        st = entry.stat()
+        summary = read_session_summary(f)
         
         sessions.append({
             'session_id': f.stem,
             'project': f.parent.name,
-            'modified': datetime.fromtimestamp(f.stat().st_mtime),
-            'size': f.stat().st_size,
+            'modified': datetime.fromtimestamp(st.st_mtime),
+            'size': st.st_size,
             'summary': summary
         })
     
     return sessions
-
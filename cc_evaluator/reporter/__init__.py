@@ -2,6 +2,6 @@
 报告生成模块
 """
 from .score_reporter import ScoreReporter, generate_report
+from .session_list import format_session_list
 
-__all__ = ['ScoreReporter', 'generate_report']
-
+__all__ = ['ScoreReporter', 'generate_report', 'format_session_list']
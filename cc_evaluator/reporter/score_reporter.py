@@ -1,53 +1,90 @@
 """
 评分报告生成器
 """
+import functools
 import json
 import unicodedata
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from ..models import EvaluationReport, EvaluationResult, SessionData
 
+# 优先使用 orjson（C实现）生成JSON报告，未安装时回退到标准库
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _dumps_json(data: dict) -> str:
+    """序列化为缩进2格、保留非ASCII字符的JSON文本"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode('utf-8')
+        except TypeError:  # orjson.JSONEncodeError 是其子类（如超出64位的整数）
+            pass
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+
+class _CharWidthCache(dict):
+    """字符显示宽度缓存，未命中时查询 Unicode 属性并记录"""
+    
+    def __missing__(self, char: str) -> int:
+        # 使用 Unicode East Asian Width 属性判断字符宽度
+        # F(Fullwidth)=全角, W(Wide)=宽字符
+        # 注意：A(Ambiguous)不包含，因为在大多数终端它们显示为1宽度
+        width = 2 if unicodedata.east_asian_width(char) in ('F', 'W') else 1
+        self[char] = width
+        return width
+
+
+# 报告中反复出现的字符集很小，预置可打印ASCII字符
+_CHAR_WIDTHS = _CharWidthCache({chr(c): 1 for c in range(0x20, 0x7F)})
+
 
 def get_char_width(char: str) -> int:
     """获取单个字符的显示宽度"""
-    # 使用 Unicode East Asian Width 属性判断字符宽度
-    # F(Fullwidth)=全角, W(Wide)=宽字符
-    # 注意：A(Ambiguous)不包含，因为在大多数终端它们显示为1宽度
-    w = unicodedata.east_asian_width(char)
-    if w in ('F', 'W'):
-        return 2
-    return 1
+    return _CHAR_WIDTHS[char]
 
 
 def get_display_width(text: str) -> int:
     """计算字符串显示宽度（全角字符算2，半角算1）"""
-    width = 0
-    for char in text:
-        width += get_char_width(char)
-    return width
+    # 纯ASCII字符串（会话ID、路径、分数等）每个字符宽度都是1
+    if text.isascii():
+        return len(text)
+    return sum(map(_CHAR_WIDTHS.__getitem__, text))
 
 
-def truncate_text(text: str, max_width: int) -> str:
-    """截断文本以适应显示宽度"""
+def _truncate_with_width(text: str, max_width: int) -> Tuple[str, int]:
+    """截断文本以适应显示宽度，同时返回截断后的显示宽度（单次遍历）"""
+    if text.isascii():
+        text = text[:max(max_width, 0)]
+        return text, len(text)
     current_width = 0
-    res = ""
-    for char in text:
-        char_width = get_char_width(char)
+    for i, char in enumerate(text):
+        char_width = _CHAR_WIDTHS[char]
         if current_width + char_width > max_width:
-            # 如果加上这个字符会超长，就不加了
-            break
-        res += char
+            # 如果加上这个字符会超长，就截断在它之前
+            return text[:i], current_width
         current_width += char_width
-    return res
+    return text, current_width
+
+
+def truncate_text(text: str, max_width: int) -> str:
+    """截断文本以适应显示宽度"""
+    return _truncate_with_width(text, max_width)[0]
 
 
 def pad_text(text: str, width: int, align: str = 'left') -> str:
     """填充文本以达到指定显示宽度"""
-    # 先截断，防止超长破坏表格
-    text = truncate_text(text, width)
+    # ASCII文本显示宽度等于长度，左右对齐直接用内置方法
+    # （居中不用 str.center：奇数填充时它的余量分配与下面的规则不同）
+    if align in ('left', 'right') and text.isascii():
+        text = text[:max(width, 0)]
+        return text.ljust(width) if align == 'left' else text.rjust(width)
     
-    current_width = get_display_width(text)
+    # 先截断，防止超长破坏表格
+    text, current_width = _truncate_with_width(text, width)
     padding = max(0, width - current_width)
     
     if align == 'left':
@@ -60,9 +97,34 @@ def pad_text(text: str, width: int, align: str = 'left') -> str:
         return ' ' * left_pad + text + ' ' * right_pad
 
 
+def _escape_md_cell(text: Optional[str]) -> str:
+    """转义Markdown表格单元格中的竖线"""
+    return text.replace("|", "\\|") if text else ""
+
+
+def _cached_render(method):
+    """缓存报告的渲染结果（报告生成后不再变化，重复输出时无需重新渲染）"""
+    @functools.wraps(method)
+    def wrapper(self):
+        name = method.__name__
+        if name not in self._rendered:
+            self._rendered[name] = method(self)
+        return self._rendered[name]
+    return wrapper
+
+
 class ScoreReporter:
     """评分报告生成器"""
     
+    # 表格内宽及边框/分隔线（与报告内容无关，只构造一次）
+    _TABLE_INNER_WIDTH = 60
+    _BORDER_TOP = "╔" + "═" * _TABLE_INNER_WIDTH + "╗"
+    _BORDER_MID_EQ = "╠" + "═" * _TABLE_INNER_WIDTH + "╣"
+    _BORDER_MID_DASH = "╠" + "─" * _TABLE_INNER_WIDTH + "╣"
+    _BORDER_BOTTOM = "╚" + "═" * _TABLE_INNER_WIDTH + "╝"
+    # 列宽: 维度 20, 得分 10, 详情 30. 总和 60.
+    _COLUMN_WIDTHS = (20, 10, 30)
+    
     def __init__(self, report: EvaluationReport, session: Optional[SessionData] = None):
         """
         初始化报告生成器
@@ -73,61 +135,53 @@ class ScoreReporter:
         """
         self.report = report
         self.session = session
+        self._rendered = {}  # 渲染结果缓存: {方法名: 报告文本}
+        self._timestamp_str = report.timestamp.strftime('%Y-%m-%d %H:%M:%S')  # 表格和Markdown共用
     
+    def _format_table_row(self, index: int, result: EvaluationResult) -> str:
+        """格式化表格中的一行评分明细"""
+        col1_w, col2_w, col3_w = self._COLUMN_WIDTHS
+        name = f" {index}. {result.name}"
+        score = f" {result.score:.3f}"
+        detail = f" {result.detail}" if result.detail else ""
+        return f"║{pad_text(name, col1_w)}{pad_text(score, col2_w)}{pad_text(detail, col3_w)}║"
+    
+    @_cached_render
     def to_table(self) -> str:
         """生成表格格式报告"""
-        lines = []
-        inner_width = 60
+        inner_width = self._TABLE_INNER_WIDTH
         
-        # 标题
-        lines.append("╔" + "═" * inner_width + "╗")
-        title = "Claude Code 会话评分报告"
-        lines.append("║" + pad_text(title, inner_width, 'center') + "║")
-        lines.append("╠" + "═" * inner_width + "╣")
-        
-        # 会话信息
         # " 会话ID: " 宽度为 9
         label_width = 9
         val_width = inner_width - label_width
         
-        val = self.report.session_id
-        lines.append("║" + " 会话ID: " + pad_text(val, val_width) + "║")
-        
-        val = self.report.project_path
-        lines.append("║" + " 项目:   " + pad_text(val, val_width) + "║")
-        
-        val = self.report.timestamp.strftime('%Y-%m-%d %H:%M:%S')
-        lines.append("║" + " 时间:   " + pad_text(val, val_width) + "║")
-        
-        # 评分明细
-        lines.append("╠" + "═" * inner_width + "╣")
-        
-        # 定义列宽
-        # 维度: 20, 得分: 10, 详情: 30. 总和 60.
-        col1_w = 20
-        col2_w = 10
-        col3_w = 30
+        col1_w, col2_w, col3_w = self._COLUMN_WIDTHS
         
-        header = "║" + pad_text(" 维度", col1_w) + pad_text(" 得分", col2_w) + pad_text(" 详情", col3_w) + "║"
-        lines.append(header)
-        lines.append("╠" + "─" * inner_width + "╣")
+        lines = [
+            # 标题
+            self._BORDER_TOP,
+            f"║{pad_text('Claude Code 会话评分报告', inner_width, 'center')}║",
+            self._BORDER_MID_EQ,
+            # 会话信息
+            f"║ 会话ID: {pad_text(self.report.session_id, val_width)}║",
+            f"║ 项目:   {pad_text(self.report.project_path, val_width)}║",
+            f"║ 时间:   {pad_text(self._timestamp_str, val_width)}║",
+            # 评分明细
+            self._BORDER_MID_EQ,
+            f"║{pad_text(' 维度', col1_w)}{pad_text(' 得分', col2_w)}{pad_text(' 详情', col3_w)}║",
+            self._BORDER_MID_DASH,
+        ]
         
-        for i, result in enumerate(self.report.results, 1):
-            name = f" {i}. {result.name}"
-            score = f" {result.score:.3f}"
-            detail = f" {result.detail}" if result.detail else ""
-            
-            row = "║" + pad_text(name, col1_w) + pad_text(score, col2_w) + pad_text(detail, col3_w) + "║"
-            lines.append(row)
+        lines.extend(self._format_table_row(i, result) for i, result in enumerate(self.report.results, 1))
         
         # 总分
-        lines.append("╠" + "═" * inner_width + "╣")
-        footer = "║" + pad_text(" 综合得分", col1_w) + pad_text(f" {self.report.total_score:.3f}", col2_w) + pad_text(" (总分)", col3_w) + "║"
-        lines.append(footer)
-        lines.append("╚" + "═" * inner_width + "╝")
+        lines.append(self._BORDER_MID_EQ)
+        lines.append(f"║{pad_text(' 综合得分', col1_w)}{pad_text(f' {self.report.total_score:.3f}', col2_w)}{pad_text(' (总分)', col3_w)}║")
+        lines.append(self._BORDER_BOTTOM)
         
         return "\n".join(lines)
     
+    @_cached_render
     def to_json(self) -> str:
         """生成JSON格式报告"""
         data = {
@@ -150,14 +204,15 @@ class ScoreReporter:
         
         if self.session:
             data['session_info'] = {
-                'prompt_count': len(self.session.user_prompts),
+                'prompt_count': self.session.prompt_count,
                 'assistant_count': len(self.session.assistant_responses),
                 'code_operations': len(self.session.code_operations),
                 'total_lines': self.session.total_lines
             }
         
-        return json.dumps(data, ensure_ascii=False, indent=2)
+        return _dumps_json(data)
     
+    @_cached_render
     def to_markdown(self) -> str:
         """生成Markdown格式报告"""
         lines = []
@@ -168,7 +223,7 @@ class ScoreReporter:
         lines.append("")
         lines.append(f"- **会话ID**: `{self.report.session_id}`")
         lines.append(f"- **项目**: `{self.report.project_path}`")
-        lines.append(f"- **时间**: {self.report.timestamp.strftime('%Y-%m-%d %H:%M:%S')}")
+        lines.append(f"- **时间**: {self._timestamp_str}")
         lines.append("")
         
         lines.append("## 评分明细")
@@ -176,9 +231,10 @@ class ScoreReporter:
         lines.append("| 序号 | 维度 | 得分 | 详情 |")
         lines.append("|------|------|------|------|")
         
-        for i, result in enumerate(self.report.results, 1):
-            detail = result.detail.replace("|", "\\|") if result.detail else ""
-            lines.append(f"| {i} | {result.name} | {result.score:.3f} | {detail} |")
+        lines.extend([
+            f"| {i} | {result.name} | {result.score:.3f} | {_escape_md_cell(result.detail)} |"
+            for i, result in enumerate(self.report.results, 1)
+        ])
         
         lines.append("")
         lines.append(f"## 综合得分: **{self.report.total_score:.3f}**")
@@ -192,7 +248,7 @@ class ScoreReporter:
                 lines.append(f"- 行数: {op.lines}")
                 lines.append("")
                 lines.append("```python")
-                lines.append(op.content[:500] if len(op.content) > 500 else op.content)
+                lines.append(op.content[:500])
                 if len(op.content) > 500:
                     lines.append("# ... (truncated)")
                 lines.append("```")
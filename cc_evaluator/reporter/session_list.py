@@ -0,0 +1,18 @@
+"""
+会话列表格式化
+"""
+from typing import Any, Dict, List
+
+# 会话列表表头（固定内容，只构造一次）
+_SESSION_LIST_HEADER = f"{'序号':<4} {'会话ID':<38} {'修改时间':<20} {'摘要':<30}\n" + "-" * 100
+
+
+def format_session_list(sessions: List[Dict[str, Any]]) -> str:
+    """将 list_sessions 的结果格式化为文本表格（表头 + 每个会话一行）"""
+    rows = (
+        f"{i:<4} {s['session_id'][:36]:<38} "
+        f"{s['modified'].isoformat(sep=' ', timespec='seconds'):<20} "
+        f"{s['summary'][:30] if s['summary'] else '(无摘要)':<30}"
+        for i, s in enumerate(sessions, 1)
+    )
+    return _SESSION_LIST_HEADER + "\n" + "\n".join(rows)
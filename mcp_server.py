@@ -27,15 +27,15 @@ except ImportError:
     print("错误: 请先安装 mcp: pip install mcp", file=sys.stderr)
     sys.exit(1)
 
-from cc_evaluator.config import CLAUDE_PROJECTS_DIR
 from cc_evaluator.models import SessionData
 from cc_evaluator.parser.session_parser import (
     parse_session_file,
     find_latest_session,
+    find_session_file,
     list_sessions as core_list_sessions,
 )
 from cc_evaluator.main import evaluate_session as core_evaluate_session
-from cc_evaluator.reporter import ScoreReporter, generate_report
+from cc_evaluator.reporter import ScoreReporter, generate_report, format_session_list
 
 # 创建 FastMCP 实例
 mcp = FastMCP("cc-eval", dependencies=["mcp"])
@@ -70,20 +70,14 @@ async def evaluate_session(
     Returns:
         完整的评分报告表格（包含所有维度的详细得分和说明）
     """
-    logger.info(f"Tool Call: evaluate_session(session_id={session_id}, format={format})")
+    logger.info("Tool Call: evaluate_session(session_id=%s, format=%s)", session_id, format)
     
     try:
         # 确定会话文件
-        session_file = None
         if session_id:
-            for project_dir in CLAUDE_PROJECTS_DIR.iterdir():
-                if project_dir.is_dir():
-                    candidate = project_dir / f"{session_id}.jsonl"
-                    if candidate.exists():
-                        session_file = candidate
-                        break
+            session_file = find_session_file(session_id)
             if not session_file:
-                logger.warning(f"Session not found: {session_id}")
+                logger.warning("Session not found: %s", session_id)
                 return f"错误: 找不到会话 {session_id}"
         else:
             session_file = find_latest_session(project_path)
@@ -91,7 +85,7 @@ async def evaluate_session(
                 logger.warning("No session files found")
                 return "错误: 找不到任何会话。请确保 Claude Code 已运行过至少一次。"
 
-        logger.info(f"Target file: {session_file}")
+        logger.info("Target file: %s", session_file)
 
         # 核心逻辑 (直接调用，FastMCP 会捕获 stdout/stderr)
         # 但为了保险，我们还是尽量不让它打印到控制台
@@ -99,7 +93,7 @@ async def evaluate_session(
         
         # 确保是 SessionData 对象
         if not isinstance(session, SessionData):
-            logger.error(f"parse_session_file returned unexpected type: {type(session)}")
+            logger.error("parse_session_file returned unexpected type: %s", type(session))
             return "内部错误: 会话解析失败"
 
         results = core_evaluate_session(session, first_completed, completion_rate)
@@ -113,11 +107,11 @@ async def evaluate_session(
         else:
             output = reporter.to_table()
             
-        logger.info(f"Evaluation successful, returning report of length {len(output)}")
+        logger.info("Evaluation successful, returning report of length %d", len(output))
         return output
 
     except Exception as e:
-        logger.error(f"Error in evaluate_session: {e}", exc_info=True)
+        logger.error("Error in evaluate_session: %s", e, exc_info=True)
         return f"执行出错: {str(e)}"
 
 
@@ -130,7 +124,7 @@ async def list_sessions(project_path: str = None, limit: int = 10) -> str:
         project_path: 项目路径（可选）
         limit: 返回数量限制（默认10）
     """
-    logger.info(f"Tool Call: list_sessions(limit={limit})")
+    logger.info("Tool Call: list_sessions(limit=%s)", limit)
     
     try:
         import inspect
@@ -144,20 +138,10 @@ async def list_sessions(project_path: str = None, limit: int = 10) -> str:
         if not sessions:
             return "没有找到任何会话"
 
-        lines = [f"找到 {len(sessions)} 个会话:\n"]
-        lines.append(f"{'序号':<4} {'会话ID':<38} {'修改时间':<20} {'摘要':<30}")
-        lines.append("-" * 100)
-        
-        for i, s in enumerate(sessions, 1):
-            session_id = s['session_id'][:36]
-            modified = s['modified'].strftime('%Y-%m-%d %H:%M:%S')
-            summary = s['summary'][:30] if s['summary'] else "(无摘要)"
-            lines.append(f"{i:<4} {session_id:<38} {modified:<20} {summary:<30}")
-            
-        return "\n".join(lines)
+        return f"找到 {len(sessions)} 个会话:\n\n" + format_session_list(sessions)
 
     except Exception as e:
-        logger.error(f"Error in list_sessions: {e}", exc_info=True)
+        logger.error("Error in list_sessions: %s", e, exc_info=True)
         return f"执行出错: {str(e)}"
 
 
@@ -169,17 +153,10 @@ async def get_session_info(session_id: str) -> str:
     Args:
         session_id: 会话ID (必需)
     """
-    logger.info(f"Tool Call: get_session_info(session_id={session_id})")
+    logger.info("Tool Call: get_session_info(session_id=%s)", session_id)
     
     try:
-        session_file = None
-        for project_dir in CLAUDE_PROJECTS_DIR.iterdir():
-            if project_dir.is_dir():
-                candidate = project_dir / f"{session_id}.jsonl"
-                if candidate.exists():
-                    session_file = candidate
-                    break
-        
+        session_file = find_session_file(session_id)
         if not session_file:
             return f"错误: 找不到会话 {session_id}"
 
@@ -196,7 +173,7 @@ async def get_session_info(session_id: str) -> str:
         return "\n".join(lines)
 
     except Exception as e:
-        logger.error(f"Error in get_session_info: {e}", exc_info=True)
+        logger.error("Error in get_session_info: %s", e, exc_info=True)
         return f"执行出错: {str(e)}"
 
 if __name__ == "__main__":